@@ -1,880 +1,274 @@
 from flask import (
     Flask, render_template, request, redirect,
-    url_for, send_file, make_response, session, flash
+    url_for, send_file, make_response, session, flash, g
 )
 import sqlite3
 import os
-import random
-from xhtml2pdf import pisa
+import queue
+import threading
+import atexit
+import time
+import hashlib
+import pickle
 from io import BytesIO
-from functools import wraps
+from functools import wraps, lru_cache
 from werkzeug.security import generate_password_hash, check_password_hash
-import pandas as pd  # For Excel import/export
+from flask_caching import Cache
+
+# pandas, xlsxwriter and the PDF libraries are imported inside the Excel / PDF
+# handlers: together they add over a second to every worker's startup
 
 app = Flask(__name__)
 app.secret_key = "change_this_secret_key"   # IMPORTANT: change for security
-DB_NAME = "question_bank.db"
-
-
-# ---------- DB HELPER ----------
-
-def get_db():
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-
-def init_db():
-    conn = get_db()
-    cur = conn.cursor()
-
-    # subjects (one record per subject)
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS subjects (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            code TEXT NOT NULL,
-            name TEXT NOT NULL
-        )
-    """)
-
-    # modules / units inside a subject
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS modules (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            subject_id INTEGER NOT NULL,
-            module_no INTEGER NOT NULL,
-            title TEXT NOT NULL,
-            FOREIGN KEY (subject_id) REFERENCES subjects(id)
-        )
-    """)
-
-    # topics inside a module
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS topics (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            module_id INTEGER NOT NULL,
-            name TEXT NOT NULL,
-            FOREIGN KEY (module_id) REFERENCES modules(id)
-        )
-    """)
-
-    # questions inside a topic
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS questions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            topic_id INTEGER NOT NULL,
-            question_text TEXT NOT NULL,
-            marks INTEGER NOT NULL,
-            difficulty TEXT NOT NULL,           -- Easy / Medium / Hard
-            cognitive_level TEXT NOT NULL,      -- Remember / Understand / Apply / Analyze / Evaluate / Create
-            co TEXT,                            -- e.g. CO1, CO2
-            po TEXT,                            -- e.g. PO1, PO2
-            created_by INTEGER,                 -- user id (faculty/admin)
-            FOREIGN KEY (topic_id) REFERENCES topics(id)
-        )
-    """)
-
-    # users (login accounts)
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            role TEXT NOT NULL                 -- 'admin' or 'faculty'
-        )
-    """)
-
-    # Activity logs (who did what operations)
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            action TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users(id)
-        )
-    """)
-
-    conn.commit()
-
-    # create default admin if not exists
-    cur.execute("SELECT * FROM users WHERE username = ?", ("admin",))
-    if not cur.fetchone():
-        admin_pass = generate_password_hash("admin123")
-        cur.execute(
-            "INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
-            ("admin", admin_pass, "admin"),
-        )
-        conn.commit()
-
-    conn.close()
-
-
-# Initialize DB
-if not os.path.exists(DB_NAME):
-    init_db()
-else:
-    init_db()
-
-
-# ---------- AUTH HELPERS ----------
-
-def login_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        if "user_id" not in session:
-            flash("Please login to continue.", "error")
-            return redirect(url_for("login", next=request.path))
-        return f(*args, **kwargs)
-    return decorated
-
-
-def admin_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        if "user_id" not in session:
-            flash("Please login to continue.", "error")
-            return redirect(url_for("login", next=request.path))
-        if session.get("role") != "admin":
-            flash("Admin access required.", "error")
-            return redirect(url_for("index"))
-        return f(*args, **kwargs)
-    return decorated
-
-
-def add_log(user_id, action):
-    if not user_id:
-        return
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("INSERT INTO logs (user_id, action) VALUES (?, ?)", (user_id, action))
-    conn.commit()
-    conn.close()
-
-
-# ---------- ROUTES: AUTH ----------
-
-@app.route("/login", methods=["GET", "POST"])
-def login():
-    if request.method == "POST":
-        username = request.form["username"].strip()
-        password = request.form["password"].strip()
-
-        conn = get_db()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM users WHERE username = ?", (username,))
-        user = cur.fetchone()
-        conn.close()
-
-        if user and check_password_hash(user["password_hash"], password):
-            session["user_id"] = user["id"]
-            session["username"] = user["username"]
-            session["role"] = user["role"]
-            flash(f"Logged in as {user['username']} ({user['role']})", "success")
-            add_log(user["id"], "Logged in")
-            next_url = request.args.get("next") or url_for("index")
-            return redirect(next_url)
-        else:
-            flash("Invalid username or password.", "error")
-
-    return render_template("login.html")
-
-
-@app.route("/logout")
-def logout():
-    user_id = session.get("user_id")
-    add_log(user_id, "Logged out")
-    session.clear()
-    flash("Logged out.", "success")
-    return redirect(url_for("login"))
-
-
-# (Optional) simple user registration for faculty (admin can create)
-@app.route("/create-user", methods=["GET", "POST"])
-@admin_required
-def create_user():
-    if request.method == "POST":
-        username = request.form["username"].strip()
-        password = request.form["password"].strip()
-        role = request.form.get("role", "faculty")
-
-        if not username or not password:
-            flash("Username and password required.", "error")
-            return redirect(url_for("create_user"))
-
-        conn = get_db()
-        cur = conn.cursor()
-        try:
-            pw_hash = generate_password_hash(password)
-            cur.execute(
-                "INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
-                (username, pw_hash, role),
-            )
-            conn.commit()
-            flash("User created successfully.", "success")
-            add_log(session.get("user_id"), f"Created user {username} ({role})")
-        except sqlite3.IntegrityError:
-            flash("Username already exists.", "error")
-        finally:
-            conn.close()
-
-    return render_template("create_user.html")
-
-
-# ---------- ROUTES: CORE PAGES ----------
-
-@app.route("/")
-@login_required
-def index():
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT COUNT(*) AS c FROM subjects")
-    subjects_count = cur.fetchone()["c"]
-    cur.execute("SELECT COUNT(*) AS c FROM questions")
-    questions_count = cur.fetchone()["c"]
-    conn.close()
-    return render_template(
-        "index.html",
-        subjects_count=subjects_count,
-        questions_count=questions_count,
-    )
-
-
-# ---- SUBJECTS ----
-
-@app.route("/subjects", methods=["GET", "POST"])
-@admin_required
-def subjects():
-    conn = get_db()
-    cur = conn.cursor()
-
-    if request.method == "POST":
-        action = request.form.get("action")
-
-        if action == "add":
-            code = request.form["code"].strip()
-            name = request.form["name"].strip()
-            if code and name:
-                cur.execute(
-                    "INSERT INTO subjects (code, name) VALUES (?, ?)", (code, name)
-                )
-                conn.commit()
-                flash("Subject added.", "success")
-                add_log(session.get("user_id"), f"Added subject {code} - {name}")
-
-        elif action == "edit":
-            subject_id = request.form["subject_id"]
-            code = request.form["code"].strip()
-            name = request.form["name"].strip()
-            cur.execute(
-                "UPDATE subjects SET code=?, name=? WHERE id=?",
-                (code, name, subject_id),
-            )
-            conn.commit()
-            flash("Subject updated.", "success")
-            add_log(session.get("user_id"), f"Edited subject ID {subject_id}")
-
-        elif action == "delete":
-            subject_id = request.form["subject_id"]
-            cur.execute("DELETE FROM subjects WHERE id=?", (subject_id,))
-            conn.commit()
-            flash("Subject deleted.", "success")
-            add_log(session.get("user_id"), f"Deleted subject ID {subject_id}")
-
-    cur.execute("SELECT * FROM subjects ORDER BY code")
-    subjects_list = cur.fetchall()
-    conn.close()
-    return render_template("subjects.html", subjects=subjects_list)
-
-
-# ---- MODULES / UNITS ----
-
-@app.route("/subjects/<int:subject_id>/modules", methods=["GET", "POST"])
-@admin_required
-def modules(subject_id):
-    conn = get_db()
-    cur = conn.cursor()
-
-    cur.execute("SELECT * FROM subjects WHERE id=?", (subject_id,))
-    subject = cur.fetchone()
-
-    if not subject:
-        conn.close()
-        flash("Subject not found.", "error")
-        return redirect(url_for("subjects"))
-
-    if request.method == "POST":
-        action = request.form.get("action")
-
-        if action == "add":
-            module_no = request.form["module_no"]
-            title = request.form["title"].strip()
-            if module_no and title:
-                cur.execute(
-                    "INSERT INTO modules (subject_id, module_no, title) VALUES (?, ?, ?)",
-                    (subject_id, module_no, title),
-                )
-                conn.commit()
-                flash("Module added.", "success")
-                add_log(session.get("user_id"),
-                        f"Added module {module_no} - {title} in subject {subject['code']}")
-
-        elif action == "edit":
-            module_id = request.form["module_id"]
-            module_no = request.form["module_no"]
-            title = request.form["title"].strip()
-            cur.execute(
-                "UPDATE modules SET module_no=?, title=? WHERE id=?",
-                (module_no, title, module_id),
-            )
-            conn.commit()
-            flash("Module updated.", "success")
-            add_log(session.get("user_id"), f"Edited module ID {module_id}")
-
-        elif action == "delete":
-            module_id = request.form["module_id"]
-            cur.execute("DELETE FROM modules WHERE id=?", (module_id,))
-            conn.commit()
-            flash("Module deleted.", "success")
-            add_log(session.get("user_id"), f"Deleted module ID {module_id}")
-
-    cur.execute(
-        "SELECT * FROM modules WHERE subject_id=? ORDER BY module_no", (subject_id,)
-    )
-    modules_list = cur.fetchall()
-    conn.close()
-
-    return render_template("modules.html", subject=subject, modules=modules_list)
-
-
-# ---- TOPICS ----
-
-@app.route("/modules/<int:module_id>/topics", methods=["GET", "POST"])
-@admin_required
-def topics(module_id):
-    conn = get_db()
-    cur = conn.cursor()
-
-    cur.execute(
-        "SELECT m.*, s.name AS subject_name, s.code AS subject_code "
-        "FROM modules m JOIN subjects s ON m.subject_id = s.id WHERE m.id=?",
-        (module_id,),
-    )
-    module = cur.fetchone()
-
-    if not module:
-        conn.close()
-        flash("Module not found.", "error")
-        return redirect(url_for("subjects"))
-
-    if request.method == "POST":
-        action = request.form.get("action")
-
-        if action == "add":
-            name = request.form["name"].strip()
-            if name:
-                cur.execute(
-                    "INSERT INTO topics (module_id, name) VALUES (?, ?)",
-                    (module_id, name),
-                )
-                conn.commit()
-                flash("Topic added.", "success")
-                add_log(session.get("user_id"),
-                        f"Added topic '{name}' in module {module['module_no']}")
-
-        elif action == "edit":
-            topic_id = request.form["topic_id"]
-            name = request.form["name"].strip()
-            cur.execute("UPDATE topics SET name=? WHERE id=?", (name, topic_id))
-            conn.commit()
-            flash("Topic updated.", "success")
-            add_log(session.get("user_id"), f"Edited topic ID {topic_id}")
-
-        elif action == "delete":
-            topic_id = request.form["topic_id"]
-            cur.execute("DELETE FROM topics WHERE id=?", (topic_id,))
-            conn.commit()
-            flash("Topic deleted.", "success")
-            add_log(session.get("user_id"), f"Deleted topic ID {topic_id}")
-
-    cur.execute("SELECT * FROM topics WHERE module_id=? ORDER BY id", (module_id,))
-    topics_list = cur.fetchall()
-    conn.close()
-    return render_template("topics.html", module=module, topics=topics_list)
-
-
-# ---- ANALYTICS (for Chart.js) ----
-
-@app.route("/analytics")
-@admin_required
-def analytics():
-    conn = get_db()
-    cur = conn.cursor()
-
-    # Questions count by difficulty
-    cur.execute("SELECT difficulty, COUNT(*) AS c FROM questions GROUP BY difficulty")
-    difficulty = {row["difficulty"]: row["c"] for row in cur.fetchall()}
-
-    # Questions count by modules
-    cur.execute("""
-        SELECT m.module_no, COUNT(q.id) AS c
-        FROM questions q
-        JOIN topics t ON q.topic_id = t.id
-        JOIN modules m ON t.module_id = m.id
-        GROUP BY m.module_no
-        ORDER BY m.module_no
-    """)
-    module_data = [(row["module_no"], row["c"]) for row in cur.fetchall()]
-
-    conn.close()
-
-    return render_template(
-        "analytics.html",
-        difficulty=difficulty,
-        module_labels=[m[0] for m in module_data],
-        module_values=[m[1] for m in module_data]
-    )
-
-
-# ---- EXPORT EXCEL ----
-
-@app.route("/export-excel")
-@admin_required
-def export_excel():
-    conn = get_db()
-    df = pd.read_sql_query("""
-        SELECT q.id, q.question_text, q.marks, q.difficulty, q.cognitive_level,
-               q.co, q.po, t.name AS topic, m.module_no, s.code AS subject
-        FROM questions q
-        JOIN topics t ON q.topic_id = t.id
-        JOIN modules m ON t.module_id = m.id
-        JOIN subjects s ON m.subject_id = s.id
-    """, conn)
-    conn.close()
-
-    file_path = "questionbank_export.xlsx"
-    df.to_excel(file_path, index=False)
-    add_log(session.get("user_id"), "Exported question bank to Excel")
-
-    return send_file(file_path, as_attachment=True)
-
-
-# ---- IMPORT EXCEL ----
-
-@app.route("/import-excel", methods=["GET", "POST"])
-@admin_required
-def import_excel():
-    if request.method == "POST":
-        file = request.files["file"]
-        if not file:
-            flash("Please select a file.", "error")
-            return redirect(url_for("import_excel"))
-
-        df = pd.read_excel(file)
-
-        conn = get_db()
-        cur = conn.cursor()
-
-        for _, row in df.iterrows():
-            qt = str(row.get("question_text", "")).strip()
-            if not qt:
-                continue
-
-            # Basic duplicate skip
-            cur.execute("SELECT id FROM questions WHERE question_text=?", (qt,))
-            if cur.fetchone():
-                continue
-
-            marks = int(row.get("marks", 2))
-            difficulty = str(row.get("difficulty", "Medium"))
-            cognitive = str(row.get("cognitive_level", "Understand"))
-            co = str(row.get("co", "")).strip()
-            po = str(row.get("po", "")).strip()
-
-            cur.execute("""
-                INSERT INTO questions (topic_id, question_text, marks, difficulty, cognitive_level, co, po)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (1, qt, marks, difficulty, cognitive, co, po))  # default topic_id=1 or adjust logic
-
-        conn.commit()
-        conn.close()
-        flash("Questions imported successfully from Excel!", "success")
-        add_log(session.get("user_id"), "Imported questions from Excel")
-        return redirect(url_for("index"))
-
-    return render_template("import_excel.html")
-
-
-# ---- QUESTIONS ----
-
-@app.route("/topics/<int:topic_id>/questions", methods=["GET", "POST"])
-@login_required
-def questions(topic_id):
-    conn = get_db()
-    cur = conn.cursor()
-
-    cur.execute(
-        """
-        SELECT t.*, m.module_no, m.title AS module_title,
-               s.code AS subject_code, s.name AS subject_name
-        FROM topics t
-        JOIN modules m ON t.module_id = m.id
-        JOIN subjects s ON m.subject_id = s.id
-        WHERE t.id=?
-    """,
-        (topic_id,),
-    )
-    topic = cur.fetchone()
-
-    if not topic:
-        conn.close()
-        flash("Topic not found.", "error")
-        return redirect(url_for("subjects"))
-
-    if request.method == "POST":
-        action = request.form.get("action")
-        user_id = session.get("user_id")
-
-        if action == "add":
-            question_text = request.form["question_text"].strip()
-            marks = request.form.get("marks", 2)
-            difficulty = request.form.get("difficulty", "Medium")
-            cognitive_level = request.form.get("cognitive_level", "Understand")
-            co = request.form.get("co", "").strip()
-            po = request.form.get("po", "").strip()
-
-            if question_text:
-                # DUPLICATE CHECK
-                cur.execute(
-                    "SELECT id FROM questions WHERE question_text=? AND topic_id=?",
-                    (question_text, topic_id)
-                )
-                if cur.fetchone():
-                    flash("Duplicate question found! Please add a different question.", "error")
-                else:
-                    cur.execute(
-                        """
-                        INSERT INTO questions (topic_id, question_text, marks, difficulty,
-                                               cognitive_level, co, po, created_by)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    """,
-                        (
-                            topic_id,
-                            question_text,
-                            marks,
-                            difficulty,
-                            cognitive_level,
-                            co,
-                            po,
-                            user_id,
-                        ),
-                    )
-                    conn.commit()
-                    flash("Question added.", "success")
-                    add_log(user_id, f"Added question in topic {topic_id}")
-
-        elif action == "delete":
-            q_id = request.form["question_id"]
-            # Admin can delete any; faculty can delete only own questions
-            if session.get("role") == "admin":
-                cur.execute("DELETE FROM questions WHERE id=?", (q_id,))
-            else:
-                cur.execute(
-                    "DELETE FROM questions WHERE id=? AND created_by=?",
-                    (q_id, user_id),
-                )
-            conn.commit()
-            flash("Question deleted (if you had permission).", "success")
-            add_log(user_id, f"Deleted question ID {q_id}")
-
-    cur.execute(
-        "SELECT q.*, u.username as author FROM questions q "
-        "LEFT JOIN users u ON q.created_by = u.id "
-        "WHERE q.topic_id=? ORDER BY q.id DESC",
-        (topic_id,),
-    )
-    questions_list = cur.fetchall()
-    conn.close()
-
-    return render_template("questions.html", topic=topic, questions=questions_list)
-
-
-@app.route("/questions/<int:question_id>/edit", methods=["GET", "POST"])
-@login_required
-def edit_question(question_id):
-    conn = get_db()
-    cur = conn.cursor()
-
-    cur.execute(
-        """
-        SELECT q.*, t.name AS topic_name, t.id AS topic_id,
-               m.module_no, m.title AS module_title,
-               s.code AS subject_code, s.name AS subject_name
-        FROM questions q
-        JOIN topics t ON q.topic_id = t.id
-        JOIN modules m ON t.module_id = m.id
-        JOIN subjects s ON m.subject_id = s.id
-        WHERE q.id=?
-    """,
-        (question_id,),
-    )
-    question = cur.fetchone()
-
-    if not question:
-        conn.close()
-        flash("Question not found.", "error")
-        return redirect(url_for("subjects"))
-
-    user_id = session.get("user_id")
-    role = session.get("role")
-
-    # Only admin or creator can edit
-    if role != "admin" and question["created_by"] != user_id:
-        conn.close()
-        flash("You do not have permission to edit this question.", "error")
-        return redirect(url_for("questions", topic_id=question["topic_id"]))
-
-    if request.method == "POST":
-        question_text = request.form["question_text"].strip()
-        marks = request.form.get("marks", 2)
-        difficulty = request.form.get("difficulty", "Medium")
-        cognitive_level = request.form.get("cognitive_level", "Understand")
-        co = request.form.get("co", "").strip()
-        po = request.form.get("po", "").strip()
-
-        cur.execute(
-            """
-            UPDATE questions
-            SET question_text=?, marks=?, difficulty=?,
-                cognitive_level=?, co=?, po=?
-            WHERE id=?
-        """,
-            (
-                question_text,
-                marks,
-                difficulty,
-                cognitive_level,
-                co,
-                po,
-                question_id,
-            ),
-        )
-        conn.commit()
-        conn.close()
-        flash("Question updated.", "success")
-        add_log(user_id, f"Edited question ID {question_id}")
-        return redirect(url_for("questions", topic_id=question["topic_id"]))
-
-    conn.close()
-    return render_template("edit_question.html", question=question)
-
-
-# ---- SEARCH ----
-
-@app.route("/search", methods=["GET", "POST"])
-@login_required
-def search():
-    conn = get_db()
-    cur = conn.cursor()
-
-    cur.execute("SELECT * FROM subjects ORDER BY code")
-    subjects_list = cur.fetchall()
-
-    results = []
-    selected_subject = None
-    selected_module = None
-    selected_difficulty = None
-
-    if request.method == "POST":
-        subject_id = request.form.get("subject_id")
-        module_no = request.form.get("module_no")
-        difficulty = request.form.get("difficulty")
-
-        selected_difficulty = difficulty
+DB_NAME = "question_bank.db"
+PAGE_SIZE = 50          # rows per page on the logs / questions lists
+MAX_ROW_ID = 2**63 - 1  # keyset start: "after" the largest possible rowid
+
+# Fixed KDF cost so login/create-user stay predictable across Werkzeug upgrades;
+# set PASSWORD_HASH_ITERATIONS to tune it for the deployment's CPU. Hashing runs
+# only in init_db, /create-user and /login; existing hashes keep working because
+# check_password_hash reads the method and salt from the stored hash.
+PASSWORD_HASH_ITERATIONS = int(os.environ.get("PASSWORD_HASH_ITERATIONS", 150000))
+PASSWORD_HASH_METHOD = f"pbkdf2:sha256:{PASSWORD_HASH_ITERATIONS}"
+PASSWORD_SALT_LENGTH = 16
+# checked against when the username doesn't exist, so a failed login costs the
+# same KDF run either way and response time doesn't reveal valid usernames.
+# That only holds for accounts hashed with PASSWORD_HASH_METHOD: hashes made
+# with another method (e.g. Werkzeug's scrypt default on older accounts) take a
+# different time to check, and are deliberately not converted (see _needs_rehash)
+_DUMMY_HASH = generate_password_hash(
+    "dummy", method=PASSWORD_HASH_METHOD, salt_length=PASSWORD_SALT_LENGTH
+)
+PAPER_CACHE_TIMEOUT = 3600  # seconds a rendered question paper PDF is reused
+DB_POOL_SIZE = 8            # idle SQLite connections kept open for reuse
+
+# cache for dashboard/analytics aggregates and rendered papers: in-process by
+# default, shared in Redis when REDIS_URL is set so every worker sees the same
+# entries (and the same invalidations)
+if os.environ.get("REDIS_URL"):
+    cache_config = {"CACHE_TYPE": "RedisCache", "CACHE_REDIS_URL": os.environ["REDIS_URL"]}
+else:
+    cache_config = {"CACHE_TYPE": "SimpleCache"}
+cache = Cache(app, config=cache_config)
 
-        query = """
-            SELECT q.*, t.name AS topic_name, m.module_no, m.title AS module_title,
-                   s.code AS subject_code
-            FROM questions q
-            JOIN topics t ON q.topic_id = t.id
-            JOIN modules m ON t.module_id = m.id
-            JOIN subjects s ON m.subject_id = s.id
-            WHERE 1=1
-        """
-        params = []
+# server-side sessions in Redis instead of the signed cookie; opt in by
+# setting REDIS_URL (needs Flask-Session and redis installed)
+if os.environ.get("REDIS_URL"):
+    import redis
+    from flask_session import Session
 
-        if subject_id and subject_id != "all":
-            query += " AND s.id = ?"
-            params.append(subject_id)
-            cur.execute("SELECT * FROM subjects WHERE id=?", (subject_id,))
-            selected_subject = cur.fetchone()
+    app.config["SESSION_TYPE"] = "redis"
+    app.config["SESSION_REDIS"] = redis.Redis.from_url(os.environ["REDIS_URL"])
+    Session(app)
 
-        if module_no:
-            query += " AND m.module_no = ?"
-            params.append(module_no)
-            selected_module = module_no
 
-        if difficulty and difficulty != "all":
-            query += " AND q.difficulty = ?"
-            params.append(difficulty)
+# ---------- SQL ----------
+# Hot queries live here so every call passes the same string and hits
+# sqlite3's per-connection statement cache (see cached_statements below).
 
-        query += " ORDER BY s.code, m.module_no, t.name"
-        cur.execute(query, tuple(params))
-        results = cur.fetchall()
+SQL_SELECT_USER_BY_NAME = "SELECT id, password_hash, role FROM users WHERE username = ?"
 
-    conn.close()
-    return render_template(
-        "search.html",
-        subjects=subjects_list,
-        results=results,
-        selected_subject=selected_subject,
-        selected_module=selected_module,
-        selected_difficulty=selected_difficulty,
-    )
+SQL_INSERT_USER = "INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)"
 
+SQL_UPDATE_PASSWORD_HASH = "UPDATE users SET password_hash = ? WHERE id = ?"
 
-# ---- QUESTION PAPER GENERATION ----
+SQL_INSERT_LOG = "INSERT INTO logs (user_id, action, timestamp) VALUES (?, ?, ?)"
 
-def generate_question_set(subject_id, total_questions, difficulty_distribution):
-    conn = get_db()
-    cur = conn.cursor()
+SQL_DASHBOARD_COUNTS = (
+    "SELECT (SELECT COUNT(*) FROM subjects) AS s, (SELECT COUNT(*) FROM questions) AS q"
+)
 
-    paper_questions = []
+SQL_LIST_SUBJECTS = "SELECT id, code, name FROM subjects ORDER BY code"
 
-    for diff, count in difficulty_distribution.items():
-        if count <= 0:
-            continue
-        cur.execute(
-            """
-            SELECT q.*, t.name AS topic_name, m.module_no, s.code AS subject_code
-            FROM questions q
-            JOIN topics t ON q.topic_id = t.id
-            JOIN modules m ON t.module_id = m.id
-            JOIN subjects s ON m.subject_id = s.id
-            WHERE s.id = ? AND q.difficulty = ?
-        """,
-            (subject_id, diff),
-        )
-        rows = cur.fetchall()
-        rows = list(rows)
-        random.shuffle(rows)
-        paper_questions.extend(rows[:count])
+SQL_GET_SUBJECT = "SELECT id, code, name FROM subjects WHERE id=?"
 
-    conn.close()
-    return paper_questions
+SQL_LIST_QUESTIONS = (
+    "SELECT q.id, q.question_text, q.marks, q.difficulty, q.cognitive_level, "
+    "q.co, q.po, u.username as author FROM questions q "
+    "LEFT JOIN users u ON q.created_by = u.id "
+    "WHERE q.topic_id=? AND q.id < ? ORDER BY q.id DESC LIMIT ?"
+)
 
+# bumped in the same transaction as every write to subjects/modules/topics/questions
+SQL_BUMP_BANK_VERSION = "UPDATE bank_version SET version = version + 1 WHERE id = 1"
+
+SQL_INSERT_QUESTION = """
+    INSERT INTO questions (topic_id, question_text, marks, difficulty,
+                           cognitive_level, co, po, created_by)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (topic_id, question_text) DO NOTHING
+"""
+
+SQL_TOPIC_BREADCRUMB = """
+    SELECT t.id, t.name, m.module_no, m.title AS module_title,
+           s.code AS subject_code, s.name AS subject_name
+    FROM topics t
+    JOIN modules m ON t.module_id = m.id
+    JOIN subjects s ON m.subject_id = s.id
+    WHERE t.id=?
+"""
+
+SQL_LIST_LOGS = """
+    SELECT l.id, l.action, l.timestamp, u.username
+    FROM logs l
+    JOIN users u ON l.user_id = u.id
+    WHERE l.id < ?
+    ORDER BY l.id DESC
+    LIMIT ?
+"""
+
+# difficulty and module counts for /analytics in one statement
+SQL_ANALYTICS_STATS = """
+    SELECT 'difficulty' AS kind, difficulty AS k, COUNT(*) AS c
+    FROM questions
+    GROUP BY difficulty
+    UNION ALL
+    SELECT 'module', m.module_no, COUNT(q.id)
+    FROM questions q
+    JOIN topics t ON q.topic_id = t.id
+    JOIN modules m ON t.module_id = m.id
+    GROUP BY m.module_no
+    ORDER BY kind, k
+"""
+
+# questions -> topics -> modules -> subjects; each query below keeps its own
+# narrow column list and appends its own WHERE / ORDER BY
+SQL_QJOIN_FROM = """
+    FROM questions q
+    JOIN topics t ON q.topic_id = t.id
+    JOIN modules m ON t.module_id = m.id
+    JOIN subjects s ON m.subject_id = s.id
+"""
+
+SQL_SEARCH_BASE = """
+    SELECT q.question_text, q.difficulty, q.cognitive_level, q.co, q.po,
+           t.name AS topic_name, m.module_no, s.code AS subject_code
+""" + SQL_QJOIN_FROM + """
+    WHERE 1=1
+"""
+
+SQL_EXPORT_QUESTIONS = """
+    SELECT q.id, q.question_text, q.marks, q.difficulty, q.cognitive_level,
+           q.co, q.po, t.name AS topic, m.module_no, s.code AS subject
+""" + SQL_QJOIN_FROM
+
+SQL_GET_QUESTION = """
+    SELECT q.id, q.question_text, q.marks, q.difficulty, q.cognitive_level,
+           q.co, q.po, q.created_by, t.name AS topic_name, t.id AS topic_id,
+           m.module_no, m.title AS module_title,
+           s.code AS subject_code, s.name AS subject_name
+""" + SQL_QJOIN_FROM + """
+    WHERE q.id=?
+"""
+
+SQL_SAMPLE_QUESTIONS = """
+    SELECT q.id, q.question_text, q.marks, q.difficulty, q.cognitive_level,
+           q.co, q.po
+""" + SQL_QJOIN_FROM + """
+    WHERE s.id = ? AND q.difficulty = ?
+    ORDER BY RANDOM()
+    LIMIT ?
+"""
+
+# one fixed string per filter combination, keyed (subject?, module?, difficulty?, keyword?);
+# a single "(? IS NULL OR col = ?)" query would be planned without the s.id /
+# difficulty indexes, since the planner can't drop the OR at prepare time
+SQL_SEARCH = {
+    (sub, mod, diff, kw): SQL_SEARCH_BASE
+    + (" AND s.id = ?" if sub else "")
+    + (" AND m.module_no = ?" if mod else "")
+    + (" AND q.difficulty = ?" if diff else "")
+    + (" AND q.id IN (SELECT rowid FROM questions_fts WHERE questions_fts MATCH ?)" if kw else "")
+    + " ORDER BY s.code, m.module_no, t.name"
+    for sub in (False, True)
+    for mod in (False, True)
+    for diff in (False, True)
+    for kw in (False, True)
+}
 
-def render_pdf_from_template(template_name, **context):
-    html = render_template(template_name, **context)
-    pdf_io = BytesIO()
-    pisa_status = pisa.CreatePDF(html, dest=pdf_io)
-    if pisa_status.err:
-        return None
-    pdf_io.seek(0)
-    return pdf_io
 
+# ---------- DB HELPER ----------
 
-@app.route("/generate-paper", methods=["GET", "POST"])
-@login_required
-def generate_paper():
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM subjects ORDER BY code")
-    subjects_list = cur.fetchall()
-    conn.close()
+def _fts_query(text):
+    # quote every word so user input can't inject FTS5 query syntax
+    return " ".join('"' + word.replace('"', '""') + '"' for word in text.split())
 
-    if request.method == "POST":
-        subject_id = int(request.form["subject_id"])
-        exam_type = request.form.get("exam_type", "Internal")
 
-        easy_q = int(request.form.get("easy_q", 2))
-        med_q = int(request.form.get("med_q", 3))
-        hard_q = int(request.form.get("hard_q", 1))
+def _apply_pragmas(conn):
+    # per-connection settings (journal_mode=WAL is persistent, set in init_db)
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA cache_size = -64000")      # up to ~64 MB page cache
+    conn.execute("PRAGMA mmap_size = 268435456")    # 256 MB
+    conn.execute("PRAGMA wal_autocheckpoint = 1000")  # pages; keeps the -wal file bounded
 
-        total_q = easy_q + med_q + hard_q
 
-        paper_questions = generate_question_set(
-            subject_id,
-            total_q,
-            {"Easy": easy_q, "Medium": med_q, "Hard": hard_q},
-        )
+def _connect():
+    # check_same_thread=False: pooled connections move between request
+    # threads, but only one request uses a connection at a time
+    conn = sqlite3.connect(DB_NAME, cached_statements=256, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    _apply_pragmas(conn)
+    return conn
 
-        conn = get_db()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM subjects WHERE id=?", (subject_id,))
-        subject = cur.fetchone()
-        conn.close()
 
-        pdf_io = render_pdf_from_template(
-            "paper_template.html",
-            subject=subject,
-            exam_type=exam_type,
-            questions=paper_questions,
-        )
+# Idle connections, reused across requests so open + PRAGMA setup happens
+# once per connection. Grows on demand; extras beyond DB_POOL_SIZE are closed.
+_pool = queue.LifoQueue(maxsize=DB_POOL_SIZE)
+_inherited_pools = []
 
-        if pdf_io is None:
-            return "Error generating PDF", 500
 
-        response = make_response(pdf_io.read())
-        response.headers["Content-Type"] = "application/pdf"
-        response.headers[
-            "Content-Disposition"
-        ] = f"attachment; filename=question_paper_{subject['code']}.pdf"
-        return response
+def _reset_pool():
+    # a forked child must not use the parent's SQLite connections. Start empty,
+    # and keep the old pool referenced so garbage collection never closes
+    # (and possibly checkpoints) those handles from the child
+    global _pool
+    _inherited_pools.append(_pool)
+    _pool = queue.LifoQueue(maxsize=DB_POOL_SIZE)
 
-    return render_template("generate_paper.html", subjects=subjects_list)
 
+# SQLite connections don't survive fork (e.g. gunicorn --preload)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_pool)
 
-# ---- LOGS VIEW ----
 
-@app.route("/logs")
-@admin_required
-def logs():
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT l.action, l.timestamp, u.username
-        FROM logs l
-        JOIN users u ON l.user_id = u.id
-        ORDER BY l.id DESC
-    """)
-    data = cur.fetchall()
-    conn.close()
-    return render_template("logs.html", logs=data)
+def _checkout():
+    try:
+        return _pool.get_nowait()
+    except queue.Empty:
+        return _connect()
 
 
-if __name__ == "__main__":
-    app.run(debug=True)
-from flask import (
-    Flask, render_template, request, redirect,
-    url_for, send_file, make_response, session, flash
-)
-import sqlite3
-import os
-import random
-from xhtml2pdf import pisa
-from io import BytesIO
-from functools import wraps
-from werkzeug.security import generate_password_hash, check_password_hash
-import pandas as pd  # For Excel import/export
+def _checkin(conn):
+    if conn.in_transaction:
+        conn.rollback()  # don't hand uncommitted work to the next request
+    try:
+        _pool.put_nowait(conn)
+    except queue.Full:
+        conn.close()
 
-app = Flask(__name__)
-app.secret_key = "change_this_secret_key"   # IMPORTANT: change for security
-DB_NAME = "question_bank.db"
 
+def get_db():
+    # one pooled connection per request, returned by close_db on teardown
+    if "db" not in g:
+        g.db = _checkout()
+    return g.db
 
-# ---------- DB HELPER ----------
 
-def get_db():
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    return conn
+@app.teardown_appcontext
+def close_db(exception):
+    db = g.pop("db", None)
+    if db is not None:
+        _checkin(db)
 
 
 def init_db():
-    conn = get_db()
+    conn = _connect()
     cur = conn.cursor()
 
+    # WAL: readers don't block the writer and commits need fewer fsyncs
+    cur.execute("PRAGMA journal_mode = WAL")
+
     # subjects (one record per subject)
     cur.execute("""
         CREATE TABLE IF NOT EXISTS subjects (
@@ -921,6 +315,39 @@ def init_db():
         )
     """)
 
+    # full-text index over question_text, kept in sync by the triggers below
+    cur.execute("SELECT 1 FROM sqlite_master WHERE name = 'questions_fts'")
+    fts_is_new = cur.fetchone() is None
+    cur.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5(
+            question_text,
+            content='questions',
+            content_rowid='id',
+            tokenize='porter unicode61'
+        )
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS questions_ai AFTER INSERT ON questions BEGIN
+            INSERT INTO questions_fts (rowid, question_text) VALUES (new.id, new.question_text);
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS questions_ad AFTER DELETE ON questions BEGIN
+            INSERT INTO questions_fts (questions_fts, rowid, question_text)
+            VALUES ('delete', old.id, old.question_text);
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS questions_au AFTER UPDATE OF question_text ON questions BEGIN
+            INSERT INTO questions_fts (questions_fts, rowid, question_text)
+            VALUES ('delete', old.id, old.question_text);
+            INSERT INTO questions_fts (rowid, question_text) VALUES (new.id, new.question_text);
+        END
+    """)
+    if fts_is_new:
+        # index questions that existed before the FTS table did
+        cur.execute("INSERT INTO questions_fts (questions_fts) VALUES ('rebuild')")
+
     # users (login accounts)
     cur.execute("""
         CREATE TABLE IF NOT EXISTS users (
@@ -942,30 +369,83 @@ def init_db():
         )
     """)
 
+    # bank_version: bumped once per write request (SQL_BUMP_BANK_VERSION, in the
+    # write's own transaction); used as the ETag for /export-excel
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS bank_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    """)
+    cur.execute("INSERT OR IGNORE INTO bank_version (id, version) VALUES (1, 0)")
+    # older databases bumped it from per-row triggers, which doubled the cost of
+    # a bulk import for a value that only needs to change once per write
+    for table in ("subjects", "modules", "topics", "questions"):
+        for event in ("insert", "update", "delete"):
+            cur.execute(f"DROP TRIGGER IF EXISTS {table}_{event}_version")
+
+    # indexes for the FK joins, filters and duplicate checks
+    # (topic_id) alone keeps each topic's rows in rowid order, so the keyset
+    # question list is one range seek; the wider topic_id indexes below need a sort
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_q_topic ON questions(topic_id)")
+    # unique per topic: lets the add/import paths dedupe with ON CONFLICT DO NOTHING.
+    # Older databases can already hold duplicates (the old edit route never
+    # checked, the old add route raced). The first time through, keep the oldest
+    # row of each (topic_id, question_text) pair and move the others, unchanged,
+    # into questions_duplicates for an admin to review.
+    cur.execute("SELECT 1 FROM sqlite_master WHERE name = 'uq_q_topic_text'")
+    if cur.fetchone() is None:
+        dup_filter = "id NOT IN (SELECT MIN(id) FROM questions GROUP BY topic_id, question_text)"
+        cur.execute(f"SELECT COUNT(*) FROM questions WHERE {dup_filter}")
+        moved = cur.fetchone()[0]
+        if moved:
+            cur.execute("CREATE TABLE IF NOT EXISTS questions_duplicates AS SELECT * FROM questions WHERE 0")
+            cur.execute(f"INSERT INTO questions_duplicates SELECT * FROM questions WHERE {dup_filter}")
+            cur.execute(f"DELETE FROM questions WHERE {dup_filter}")
+            cur.execute(SQL_BUMP_BANK_VERSION)
+            app.logger.warning(
+                "Moved %d duplicate question(s) into questions_duplicates "
+                "before adding the unique (topic_id, question_text) index", moved
+            )
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_q_topic_text ON questions(topic_id, question_text)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_q_difficulty ON questions(difficulty)")
+    # search / paper generation filter on difficulty within a subject's topics
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_q_topic_difficulty ON questions(topic_id, difficulty)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_q_created_by ON questions(created_by)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_m_subject ON modules(subject_id, module_no)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_t_module ON topics(module_id)")
+    # logs are paged by rowid already; this index was never picked by the planner
+    cur.execute("DROP INDEX IF EXISTS idx_logs_id_user")
+
     conn.commit()
 
     # create default admin if not exists
-    cur.execute("SELECT * FROM users WHERE username = ?", ("admin",))
+    cur.execute("SELECT id FROM users WHERE username = ?", ("admin",))
     if not cur.fetchone():
-        admin_pass = generate_password_hash("admin123")
-        cur.execute(
-            "INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
-            ("admin", admin_pass, "admin"),
+        admin_pass = generate_password_hash(
+            "admin123", method=PASSWORD_HASH_METHOD, salt_length=PASSWORD_SALT_LENGTH
         )
+        cur.execute(SQL_INSERT_USER, ("admin", admin_pass, "admin"))
         conn.commit()
 
     conn.close()
 
 
-# Initialize DB
-if not os.path.exists(DB_NAME):
-    init_db()
-else:
-    init_db()
+# Initialize DB (every statement in init_db is idempotent, so run it unconditionally)
+init_db()
 
 
 # ---------- AUTH HELPERS ----------
 
+def _needs_rehash(pw_hash):
+    # only upgrade PBKDF2 hashes with a lower iteration count than configured;
+    # never replace a different KDF (scrypt) with this one
+    parts = pw_hash.split("$", 1)[0].split(":")
+    if parts[0] != "pbkdf2" or len(parts) < 3:
+        return False
+    return int(parts[2]) < PASSWORD_HASH_ITERATIONS
+
+
 def login_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -989,14 +469,121 @@ def admin_required(f):
     return decorated
 
 
+# ---------- ACTIVITY LOG WRITER ----------
+# add_log only queues the row; a single background thread writes queued
+# rows in batches, so requests don't wait on a commit per log line.
+
+LOG_BATCH_SIZE = 500
+_LOG_STOP = object()
+
+
+def _log_writer():
+    conn = _connect()
+    while True:
+        rows = [_log_queue.get()]
+        # gather whatever else arrives within ~100 ms into the same batch
+        while rows[-1] is not _LOG_STOP and len(rows) < LOG_BATCH_SIZE:
+            try:
+                rows.append(_log_queue.get(timeout=0.1))
+            except queue.Empty:
+                break
+
+        stop = rows[-1] is _LOG_STOP
+        if stop:
+            rows.pop()
+        if rows:
+            try:
+                with conn:
+                    conn.executemany(SQL_INSERT_LOG, rows)
+            except sqlite3.Error:
+                app.logger.exception("Failed to write %d log rows", len(rows))
+        if stop:
+            conn.close()
+            return
+
+
+def _stop_log_writer():
+    # flush pending rows on interpreter exit
+    _log_queue.put(_LOG_STOP)
+    _log_writer_thread.join(timeout=5)
+
+
+def _start_log_writer():
+    global _log_queue, _log_writer_thread
+    _log_queue = queue.Queue()
+    _log_writer_thread = threading.Thread(target=_log_writer, name="log-writer", daemon=True)
+    _log_writer_thread.start()
+
+
+_start_log_writer()
+atexit.register(_stop_log_writer)
+# threads don't survive fork (e.g. gunicorn --preload): give each worker its own writer
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_start_log_writer)
+
+
 def add_log(user_id, action):
     if not user_id:
         return
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("INSERT INTO logs (user_id, action) VALUES (?, ?)", (user_id, action))
-    conn.commit()
-    conn.close()
+    # stamp at call time (UTC, same format as CURRENT_TIMESTAMP), not at flush time
+    _log_queue.put((user_id, action, time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())))
+
+
+# ---------- CACHED QUERIES ----------
+# These results change only through the write routes below, which
+# invalidate them explicitly; the timeouts are just a safety net.
+
+@cache.memoize(timeout=60)
+def _dashboard_counts():
+    # both counts in one round trip
+    cur = get_db().cursor()
+    cur.execute(SQL_DASHBOARD_COUNTS)
+    row = cur.fetchone()
+    return row["s"], row["q"]
+
+
+@cache.memoize(timeout=60)
+def _analytics_stats():
+    # Questions count by difficulty and by module, one round trip
+    cur = get_db().cursor()
+    cur.execute(SQL_ANALYTICS_STATS)
+    difficulty, modules = {}, []
+    for row in cur:
+        if row["kind"] == "difficulty":
+            difficulty[row["k"]] = row["c"]
+        else:
+            modules.append((row["k"], row["c"]))
+    return difficulty, modules
+
+
+@cache.memoize(timeout=300)
+def _subjects_list():
+    # subject dropdowns on search / generate-paper
+    cur = get_db().cursor()
+    cur.execute(SQL_LIST_SUBJECTS)
+    return [dict(row) for row in cur]
+
+
+@cache.memoize(timeout=300)
+def _topic_breadcrumb(topic_id):
+    # topic + module + subject names shown on the questions page
+    cur = get_db().cursor()
+    cur.execute(SQL_TOPIC_BREADCRUMB, (topic_id,))
+    row = cur.fetchone()
+    return dict(row) if row else None
+
+
+def invalidate_subjects():
+    cache.delete_memoized(_subjects_list)
+
+
+def invalidate_breadcrumbs():
+    cache.delete_memoized(_topic_breadcrumb)
+
+
+def invalidate_stats():
+    cache.delete_memoized(_dashboard_counts)
+    cache.delete_memoized(_analytics_stats)
 
 
 # ---------- ROUTES: AUTH ----------
@@ -1009,15 +596,24 @@ def login():
 
         conn = get_db()
         cur = conn.cursor()
-        cur.execute("SELECT * FROM users WHERE username = ?", (username,))
+        cur.execute(SQL_SELECT_USER_BY_NAME, (username,))
         user = cur.fetchone()
-        conn.close()
 
-        if user and check_password_hash(user["password_hash"], password):
+        # always run the hash check (see _DUMMY_HASH)
+        pw_hash = user["password_hash"] if user else _DUMMY_HASH
+        if check_password_hash(pw_hash, password) and user:
+            # raise the cost of older, cheaper PBKDF2 hashes to the current setting
+            if _needs_rehash(pw_hash):
+                new_hash = generate_password_hash(
+                    password, method=PASSWORD_HASH_METHOD, salt_length=PASSWORD_SALT_LENGTH
+                )
+                with conn:
+                    cur.execute(SQL_UPDATE_PASSWORD_HASH, (new_hash, user["id"]))
+            # WHERE username = ? is an exact match, so the typed name is the stored one
             session["user_id"] = user["id"]
-            session["username"] = user["username"]
+            session["username"] = username
             session["role"] = user["role"]
-            flash(f"Logged in as {user['username']} ({user['role']})", "success")
+            flash(f"Logged in as {username} ({user['role']})", "success")
             add_log(user["id"], "Logged in")
             next_url = request.args.get("next") or url_for("index")
             return redirect(next_url)
@@ -1052,18 +648,15 @@ def create_user():
         conn = get_db()
         cur = conn.cursor()
         try:
-            pw_hash = generate_password_hash(password)
-            cur.execute(
-                "INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
-                (username, pw_hash, role),
+            pw_hash = generate_password_hash(
+                password, method=PASSWORD_HASH_METHOD, salt_length=PASSWORD_SALT_LENGTH
             )
+            cur.execute(SQL_INSERT_USER, (username, pw_hash, role))
             conn.commit()
             flash("User created successfully.", "success")
             add_log(session.get("user_id"), f"Created user {username} ({role})")
         except sqlite3.IntegrityError:
             flash("Username already exists.", "error")
-        finally:
-            conn.close()
 
     return render_template("create_user.html")
 
@@ -1073,13 +666,7 @@ def create_user():
 @app.route("/")
 @login_required
 def index():
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT COUNT(*) AS c FROM subjects")
-    subjects_count = cur.fetchone()["c"]
-    cur.execute("SELECT COUNT(*) AS c FROM questions")
-    questions_count = cur.fetchone()["c"]
-    conn.close()
+    subjects_count, questions_count = _dashboard_counts()
     return render_template(
         "index.html",
         subjects_count=subjects_count,
@@ -1102,10 +689,13 @@ def subjects():
             code = request.form["code"].strip()
             name = request.form["name"].strip()
             if code and name:
-                cur.execute(
-                    "INSERT INTO subjects (code, name) VALUES (?, ?)", (code, name)
-                )
-                conn.commit()
+                with conn:
+                    cur.execute(
+                        "INSERT INTO subjects (code, name) VALUES (?, ?)", (code, name)
+                    )
+                    cur.execute(SQL_BUMP_BANK_VERSION)
+                invalidate_stats()
+                invalidate_subjects()
                 flash("Subject added.", "success")
                 add_log(session.get("user_id"), f"Added subject {code} - {name}")
 
@@ -1113,24 +703,32 @@ def subjects():
             subject_id = request.form["subject_id"]
             code = request.form["code"].strip()
             name = request.form["name"].strip()
-            cur.execute(
-                "UPDATE subjects SET code=?, name=? WHERE id=?",
-                (code, name, subject_id),
-            )
-            conn.commit()
+            with conn:
+                cur.execute(
+                    "UPDATE subjects SET code=?, name=? WHERE id=?",
+                    (code, name, subject_id),
+                )
+                cur.execute(SQL_BUMP_BANK_VERSION)
+            invalidate_stats()
+            invalidate_breadcrumbs()
+            invalidate_subjects()
             flash("Subject updated.", "success")
             add_log(session.get("user_id"), f"Edited subject ID {subject_id}")
 
         elif action == "delete":
             subject_id = request.form["subject_id"]
-            cur.execute("DELETE FROM subjects WHERE id=?", (subject_id,))
-            conn.commit()
+            with conn:
+                cur.execute("DELETE FROM subjects WHERE id=?", (subject_id,))
+                cur.execute(SQL_BUMP_BANK_VERSION)
+            invalidate_stats()
+            invalidate_breadcrumbs()
+            invalidate_subjects()
             flash("Subject deleted.", "success")
             add_log(session.get("user_id"), f"Deleted subject ID {subject_id}")
 
-    cur.execute("SELECT * FROM subjects ORDER BY code")
+    # read directly: the cache is per worker, and this page must show the edit just made
+    cur.execute(SQL_LIST_SUBJECTS)
     subjects_list = cur.fetchall()
-    conn.close()
     return render_template("subjects.html", subjects=subjects_list)
 
 
@@ -1142,11 +740,10 @@ def modules(subject_id):
     conn = get_db()
     cur = conn.cursor()
 
-    cur.execute("SELECT * FROM subjects WHERE id=?", (subject_id,))
+    cur.execute(SQL_GET_SUBJECT, (subject_id,))
     subject = cur.fetchone()
 
     if not subject:
-        conn.close()
         flash("Subject not found.", "error")
         return redirect(url_for("subjects"))
 
@@ -1157,11 +754,13 @@ def modules(subject_id):
             module_no = request.form["module_no"]
             title = request.form["title"].strip()
             if module_no and title:
-                cur.execute(
-                    "INSERT INTO modules (subject_id, module_no, title) VALUES (?, ?, ?)",
-                    (subject_id, module_no, title),
-                )
-                conn.commit()
+                with conn:
+                    cur.execute(
+                        "INSERT INTO modules (subject_id, module_no, title) VALUES (?, ?, ?)",
+                        (subject_id, module_no, title),
+                    )
+                    cur.execute(SQL_BUMP_BANK_VERSION)
+                invalidate_stats()
                 flash("Module added.", "success")
                 add_log(session.get("user_id"),
                         f"Added module {module_no} - {title} in subject {subject['code']}")
@@ -1170,26 +769,32 @@ def modules(subject_id):
             module_id = request.form["module_id"]
             module_no = request.form["module_no"]
             title = request.form["title"].strip()
-            cur.execute(
-                "UPDATE modules SET module_no=?, title=? WHERE id=?",
-                (module_no, title, module_id),
-            )
-            conn.commit()
+            with conn:
+                cur.execute(
+                    "UPDATE modules SET module_no=?, title=? WHERE id=?",
+                    (module_no, title, module_id),
+                )
+                cur.execute(SQL_BUMP_BANK_VERSION)
+            invalidate_stats()
+            invalidate_breadcrumbs()
             flash("Module updated.", "success")
             add_log(session.get("user_id"), f"Edited module ID {module_id}")
 
         elif action == "delete":
             module_id = request.form["module_id"]
-            cur.execute("DELETE FROM modules WHERE id=?", (module_id,))
-            conn.commit()
+            with conn:
+                cur.execute("DELETE FROM modules WHERE id=?", (module_id,))
+                cur.execute(SQL_BUMP_BANK_VERSION)
+            invalidate_stats()
+            invalidate_breadcrumbs()
             flash("Module deleted.", "success")
             add_log(session.get("user_id"), f"Deleted module ID {module_id}")
 
     cur.execute(
-        "SELECT * FROM modules WHERE subject_id=? ORDER BY module_no", (subject_id,)
+        "SELECT id, module_no, title FROM modules WHERE subject_id=? ORDER BY module_no",
+        (subject_id,),
     )
     modules_list = cur.fetchall()
-    conn.close()
 
     return render_template("modules.html", subject=subject, modules=modules_list)
 
@@ -1203,14 +808,13 @@ def topics(module_id):
     cur = conn.cursor()
 
     cur.execute(
-        "SELECT m.*, s.name AS subject_name, s.code AS subject_code "
+        "SELECT m.id, m.module_no, m.title, s.name AS subject_name, s.code AS subject_code "
         "FROM modules m JOIN subjects s ON m.subject_id = s.id WHERE m.id=?",
         (module_id,),
     )
     module = cur.fetchone()
 
     if not module:
-        conn.close()
         flash("Module not found.", "error")
         return redirect(url_for("subjects"))
 
@@ -1220,11 +824,13 @@ def topics(module_id):
         if action == "add":
             name = request.form["name"].strip()
             if name:
-                cur.execute(
-                    "INSERT INTO topics (module_id, name) VALUES (?, ?)",
-                    (module_id, name),
-                )
-                conn.commit()
+                with conn:
+                    cur.execute(
+                        "INSERT INTO topics (module_id, name) VALUES (?, ?)",
+                        (module_id, name),
+                    )
+                    cur.execute(SQL_BUMP_BANK_VERSION)
+                invalidate_stats()
                 flash("Topic added.", "success")
                 add_log(session.get("user_id"),
                         f"Added topic '{name}' in module {module['module_no']}")
@@ -1232,21 +838,26 @@ def topics(module_id):
         elif action == "edit":
             topic_id = request.form["topic_id"]
             name = request.form["name"].strip()
-            cur.execute("UPDATE topics SET name=? WHERE id=?", (name, topic_id))
-            conn.commit()
+            with conn:
+                cur.execute("UPDATE topics SET name=? WHERE id=?", (name, topic_id))
+                cur.execute(SQL_BUMP_BANK_VERSION)
+            invalidate_stats()
+            invalidate_breadcrumbs()
             flash("Topic updated.", "success")
             add_log(session.get("user_id"), f"Edited topic ID {topic_id}")
 
         elif action == "delete":
             topic_id = request.form["topic_id"]
-            cur.execute("DELETE FROM topics WHERE id=?", (topic_id,))
-            conn.commit()
+            with conn:
+                cur.execute("DELETE FROM topics WHERE id=?", (topic_id,))
+                cur.execute(SQL_BUMP_BANK_VERSION)
+            invalidate_stats()
+            invalidate_breadcrumbs()
             flash("Topic deleted.", "success")
             add_log(session.get("user_id"), f"Deleted topic ID {topic_id}")
 
-    cur.execute("SELECT * FROM topics WHERE module_id=? ORDER BY id", (module_id,))
+    cur.execute("SELECT id, name FROM topics WHERE module_id=? ORDER BY id", (module_id,))
     topics_list = cur.fetchall()
-    conn.close()
     return render_template("topics.html", module=module, topics=topics_list)
 
 
@@ -1255,29 +866,11 @@ def topics(module_id):
 @app.route("/analytics")
 @admin_required
 def analytics():
-    conn = get_db()
-    cur = conn.cursor()
-
-    # Questions count by difficulty
-    cur.execute("SELECT difficulty, COUNT(*) AS c FROM questions GROUP BY difficulty")
-    difficulty = {row["difficulty"]: row["c"] for row in cur.fetchall()}
-
-    # Questions count by modules
-    cur.execute("""
-        SELECT m.module_no, COUNT(q.id) AS c
-        FROM questions q
-        JOIN topics t ON q.topic_id = t.id
-        JOIN modules m ON t.module_id = m.id
-        GROUP BY m.module_no
-        ORDER BY m.module_no
-    """)
-    module_data = [(row["module_no"], row["c"]) for row in cur.fetchall()]
-
-    conn.close()
+    difficulty_data, module_data = _analytics_stats()
 
     return render_template(
         "analytics.html",
-        difficulty=difficulty,
+        difficulty=difficulty_data,
         module_labels=[m[0] for m in module_data],
         module_values=[m[1] for m in module_data]
     )
@@ -1289,21 +882,40 @@ def analytics():
 @admin_required
 def export_excel():
     conn = get_db()
-    df = pd.read_sql_query("""
-        SELECT q.id, q.question_text, q.marks, q.difficulty, q.cognitive_level,
-               q.co, q.po, t.name AS topic, m.module_no, s.code AS subject
-        FROM questions q
-        JOIN topics t ON q.topic_id = t.id
-        JOIN modules m ON t.module_id = m.id
-        JOIN subjects s ON m.subject_id = s.id
-    """, conn)
-    conn.close()
+    cur = conn.cursor()
+
+    # unchanged bank since the client's last download -> 304, skip building
+    cur.execute("SELECT version FROM bank_version WHERE id = 1")
+    etag = f"bank-{cur.fetchone()['version']}"
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+        response.set_etag(etag)
+        return response
 
-    file_path = "questionbank_export.xlsx"
-    df.to_excel(file_path, index=False)
+    cur.execute(SQL_EXPORT_QUESTIONS)
+
+    # Stream rows from the cursor straight into the sheet; constant_memory
+    # keeps only the current row in RAM. The workbook itself is built in
+    # memory (no shared file on disk between requests).
+    import xlsxwriter  # For Excel export
+
+    xlsx_io = BytesIO()
+    workbook = xlsxwriter.Workbook(xlsx_io, {"constant_memory": True})
+    sheet = workbook.add_worksheet()
+    sheet.write_row(0, 0, [col[0] for col in cur.description])
+    for row_no, row in enumerate(cur, start=1):
+        sheet.write_row(row_no, 0, row)
+    workbook.close()
+    xlsx_io.seek(0)
     add_log(session.get("user_id"), "Exported question bank to Excel")
 
-    return send_file(file_path, as_attachment=True)
+    return send_file(
+        xlsx_io,
+        as_attachment=True,
+        download_name="questionbank_export.xlsx",
+        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        etag=etag,
+    )
 
 
 # ---- IMPORT EXCEL ----
@@ -1317,34 +929,51 @@ def import_excel():
             flash("Please select a file.", "error")
             return redirect(url_for("import_excel"))
 
+        import pandas as pd  # For Excel import
+
         df = pd.read_excel(file)
 
+        def column(name, default):
+            # missing column or empty cell -> default
+            if name not in df:
+                return pd.Series(default, index=df.index)
+            return df[name].fillna(default)
+
+        # clean column-wise instead of per row
+        df = pd.DataFrame({
+            "topic_id": 1,  # default topic_id=1 or adjust logic
+            "question_text": column("question_text", "").astype(str).str.strip(),
+            "marks": pd.to_numeric(column("marks", 2), errors="coerce").fillna(2).astype(int),
+            "difficulty": column("difficulty", "Medium").astype(str),
+            "cognitive_level": column("cognitive_level", "Understand").astype(str),
+            "co": column("co", "").astype(str).str.strip(),
+            "po": column("po", "").astype(str).str.strip(),
+        })
+
         conn = get_db()
         cur = conn.cursor()
 
-        for _, row in df.iterrows():
-            qt = str(row.get("question_text", "")).strip()
-            if not qt:
-                continue
-
-            # Basic duplicate skip
-            cur.execute("SELECT id FROM questions WHERE question_text=?", (qt,))
-            if cur.fetchone():
-                continue
+        # Basic duplicate skip: load existing texts once instead of a SELECT per row
+        # (iterate the cursor so the row list is never materialised)
+        cur.execute("SELECT question_text FROM questions")
+        existing = {r["question_text"] for r in cur}
 
-            marks = int(row.get("marks", 2))
-            difficulty = str(row.get("difficulty", "Medium"))
-            cognitive = str(row.get("cognitive_level", "Understand"))
-            co = str(row.get("co", "")).strip()
-            po = str(row.get("po", "")).strip()
+        df = df[(df["question_text"] != "") & ~df["question_text"].isin(existing)]
+        df = df.drop_duplicates("question_text")
+        rows = list(df.itertuples(index=False, name=None))
 
-            cur.execute("""
+        # one transaction for the whole file (commits on success, rolls back on error)
+        with conn:
+            cur.executemany("""
                 INSERT INTO questions (topic_id, question_text, marks, difficulty, cognitive_level, co, po)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (1, qt, marks, difficulty, cognitive, co, po))  # default topic_id=1 or adjust logic
-
-        conn.commit()
-        conn.close()
+                ON CONFLICT (topic_id, question_text) DO NOTHING
+            """, rows)
+            cur.execute(SQL_BUMP_BANK_VERSION)
+        # refresh planner statistics after a bulk load; only the table that
+        # changed, not every table and index in the file
+        cur.execute("ANALYZE questions")
+        invalidate_stats()
         flash("Questions imported successfully from Excel!", "success")
         add_log(session.get("user_id"), "Imported questions from Excel")
         return redirect(url_for("index"))
@@ -1360,21 +989,9 @@ def questions(topic_id):
     conn = get_db()
     cur = conn.cursor()
 
-    cur.execute(
-        """
-        SELECT t.*, m.module_no, m.title AS module_title,
-               s.code AS subject_code, s.name AS subject_name
-        FROM topics t
-        JOIN modules m ON t.module_id = m.id
-        JOIN subjects s ON m.subject_id = s.id
-        WHERE t.id=?
-    """,
-        (topic_id,),
-    )
-    topic = cur.fetchone()
+    topic = _topic_breadcrumb(topic_id)
 
     if not topic:
-        conn.close()
         flash("Topic not found.", "error")
         return redirect(url_for("subjects"))
 
@@ -1391,32 +1008,28 @@ def questions(topic_id):
             po = request.form.get("po", "").strip()
 
             if question_text:
-                # DUPLICATE CHECK
+                # DUPLICATE CHECK: the unique (topic_id, question_text) index skips the row
                 cur.execute(
-                    "SELECT id FROM questions WHERE question_text=? AND topic_id=?",
-                    (question_text, topic_id)
+                    SQL_INSERT_QUESTION,
+                    (
+                        topic_id,
+                        question_text,
+                        marks,
+                        difficulty,
+                        cognitive_level,
+                        co,
+                        po,
+                        user_id,
+                    ),
                 )
-                if cur.fetchone():
+                added = cur.rowcount > 0
+                if added:
+                    cur.execute(SQL_BUMP_BANK_VERSION)
+                conn.commit()
+                if not added:
                     flash("Duplicate question found! Please add a different question.", "error")
                 else:
-                    cur.execute(
-                        """
-                        INSERT INTO questions (topic_id, question_text, marks, difficulty,
-                                               cognitive_level, co, po, created_by)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    """,
-                        (
-                            topic_id,
-                            question_text,
-                            marks,
-                            difficulty,
-                            cognitive_level,
-                            co,
-                            po,
-                            user_id,
-                        ),
-                    )
-                    conn.commit()
+                    invalidate_stats()
                     flash("Question added.", "success")
                     add_log(user_id, f"Added question in topic {topic_id}")
 
@@ -1430,20 +1043,29 @@ def questions(topic_id):
                     "DELETE FROM questions WHERE id=? AND created_by=?",
                     (q_id, user_id),
                 )
+            if cur.rowcount:
+                cur.execute(SQL_BUMP_BANK_VERSION)
             conn.commit()
+            invalidate_stats()
             flash("Question deleted (if you had permission).", "success")
             add_log(user_id, f"Deleted question ID {q_id}")
 
-    cur.execute(
-        "SELECT q.*, u.username as author FROM questions q "
-        "LEFT JOIN users u ON q.created_by = u.id "
-        "WHERE q.topic_id=? ORDER BY q.id DESC",
-        (topic_id,),
-    )
+        # Post/Redirect/Get: a browser refresh won't resubmit the form
+        return redirect(url_for("questions", topic_id=topic_id,
+                                after_id=request.args.get("after_id")))
+
+    # keyset pagination: newest first, ?after_id=<last id on previous page>
+    after_id = request.args.get("after_id", MAX_ROW_ID, type=int)
+    cur.execute(SQL_LIST_QUESTIONS, (topic_id, after_id, PAGE_SIZE + 1))
     questions_list = cur.fetchall()
-    conn.close()
+    next_after_id = questions_list[PAGE_SIZE - 1]["id"] if len(questions_list) > PAGE_SIZE else None
 
-    return render_template("questions.html", topic=topic, questions=questions_list)
+    return render_template(
+        "questions.html",
+        topic=topic,
+        questions=questions_list[:PAGE_SIZE],
+        next_after_id=next_after_id,
+    )
 
 
 @app.route("/questions/<int:question_id>/edit", methods=["GET", "POST"])
@@ -1452,23 +1074,10 @@ def edit_question(question_id):
     conn = get_db()
     cur = conn.cursor()
 
-    cur.execute(
-        """
-        SELECT q.*, t.name AS topic_name, t.id AS topic_id,
-               m.module_no, m.title AS module_title,
-               s.code AS subject_code, s.name AS subject_name
-        FROM questions q
-        JOIN topics t ON q.topic_id = t.id
-        JOIN modules m ON t.module_id = m.id
-        JOIN subjects s ON m.subject_id = s.id
-        WHERE q.id=?
-    """,
-        (question_id,),
-    )
+    cur.execute(SQL_GET_QUESTION, (question_id,))
     question = cur.fetchone()
 
     if not question:
-        conn.close()
         flash("Question not found.", "error")
         return redirect(url_for("subjects"))
 
@@ -1477,7 +1086,6 @@ def edit_question(question_id):
 
     # Only admin or creator can edit
     if role != "admin" and question["created_by"] != user_id:
-        conn.close()
         flash("You do not have permission to edit this question.", "error")
         return redirect(url_for("questions", topic_id=question["topic_id"]))
 
@@ -1489,30 +1097,34 @@ def edit_question(question_id):
         co = request.form.get("co", "").strip()
         po = request.form.get("po", "").strip()
 
-        cur.execute(
-            """
-            UPDATE questions
-            SET question_text=?, marks=?, difficulty=?,
-                cognitive_level=?, co=?, po=?
-            WHERE id=?
-        """,
-            (
-                question_text,
-                marks,
-                difficulty,
-                cognitive_level,
-                co,
-                po,
-                question_id,
-            ),
-        )
+        try:
+            cur.execute(
+                """
+                UPDATE questions
+                SET question_text=?, marks=?, difficulty=?,
+                    cognitive_level=?, co=?, po=?
+                WHERE id=?
+            """,
+                (
+                    question_text,
+                    marks,
+                    difficulty,
+                    cognitive_level,
+                    co,
+                    po,
+                    question_id,
+                ),
+            )
+        except sqlite3.IntegrityError:
+            flash("Duplicate question found! Please add a different question.", "error")
+            return redirect(url_for("edit_question", question_id=question_id))
+        cur.execute(SQL_BUMP_BANK_VERSION)
         conn.commit()
-        conn.close()
+        invalidate_stats()
         flash("Question updated.", "success")
         add_log(user_id, f"Edited question ID {question_id}")
         return redirect(url_for("questions", topic_id=question["topic_id"]))
 
-    conn.close()
     return render_template("edit_question.html", question=question)
 
 
@@ -1524,52 +1136,49 @@ def search():
     conn = get_db()
     cur = conn.cursor()
 
-    cur.execute("SELECT * FROM subjects ORDER BY code")
-    subjects_list = cur.fetchall()
+    subjects_list = _subjects_list()
 
     results = []
     selected_subject = None
     selected_module = None
     selected_difficulty = None
+    selected_keyword = None
 
     if request.method == "POST":
         subject_id = request.form.get("subject_id")
         module_no = request.form.get("module_no")
         difficulty = request.form.get("difficulty")
+        keyword = request.form.get("keyword", "").strip()
 
         selected_difficulty = difficulty
+        selected_keyword = keyword
 
-        query = """
-            SELECT q.*, t.name AS topic_name, m.module_no, m.title AS module_title,
-                   s.code AS subject_code
-            FROM questions q
-            JOIN topics t ON q.topic_id = t.id
-            JOIN modules m ON t.module_id = m.id
-            JOIN subjects s ON m.subject_id = s.id
-            WHERE 1=1
-        """
+        by_subject = bool(subject_id and subject_id != "all")
+        by_module = bool(module_no)
+        by_difficulty = bool(difficulty and difficulty != "all")
+        by_keyword = bool(keyword)
         params = []
 
-        if subject_id and subject_id != "all":
-            query += " AND s.id = ?"
+        if by_subject:
             params.append(subject_id)
-            cur.execute("SELECT * FROM subjects WHERE id=?", (subject_id,))
+            cur.execute(SQL_GET_SUBJECT, (subject_id,))
             selected_subject = cur.fetchone()
 
-        if module_no:
-            query += " AND m.module_no = ?"
+        if by_module:
             params.append(module_no)
             selected_module = module_no
 
-        if difficulty and difficulty != "all":
-            query += " AND q.difficulty = ?"
+        if by_difficulty:
             params.append(difficulty)
 
-        query += " ORDER BY s.code, m.module_no, t.name"
-        cur.execute(query, tuple(params))
+        if by_keyword:
+            params.append(_fts_query(keyword))
+
+        cur.execute(
+            SQL_SEARCH[by_subject, by_module, by_difficulty, by_keyword], tuple(params)
+        )
         results = cur.fetchall()
 
-    conn.close()
     return render_template(
         "search.html",
         subjects=subjects_list,
@@ -1577,6 +1186,7 @@ def search():
         selected_subject=selected_subject,
         selected_module=selected_module,
         selected_difficulty=selected_difficulty,
+        selected_keyword=selected_keyword,
     )
 
 
@@ -1591,28 +1201,31 @@ def generate_question_set(subject_id, total_questions, difficulty_distribution):
     for diff, count in difficulty_distribution.items():
         if count <= 0:
             continue
-        cur.execute(
-            """
-            SELECT q.*, t.name AS topic_name, m.module_no, s.code AS subject_code
-            FROM questions q
-            JOIN topics t ON q.topic_id = t.id
-            JOIN modules m ON t.module_id = m.id
-            JOIN subjects s ON m.subject_id = s.id
-            WHERE s.id = ? AND q.difficulty = ?
-        """,
-            (subject_id, diff),
-        )
-        rows = cur.fetchall()
-        rows = list(rows)
-        random.shuffle(rows)
-        paper_questions.extend(rows[:count])
+        cur.execute(SQL_SAMPLE_QUESTIONS, (subject_id, diff, count))
+        paper_questions.extend(cur.fetchall())
 
-    conn.close()
     return paper_questions
 
 
+@lru_cache(maxsize=1)
+def _weasyprint():
+    # looked up once, on the first paper; None when it (or Pango) isn't installed
+    try:
+        import weasyprint  # much faster PDF layout than xhtml2pdf; needs Pango installed
+    except (ImportError, OSError):
+        return None
+    return weasyprint
+
+
 def render_pdf_from_template(template_name, **context):
     html = render_template(template_name, **context)
+    weasyprint = _weasyprint()
+    if weasyprint is not None:
+        return BytesIO(weasyprint.HTML(string=html).write_pdf())
+
+    # fallback: xhtml2pdf
+    from xhtml2pdf import pisa
+
     pdf_io = BytesIO()
     pisa_status = pisa.CreatePDF(html, dest=pdf_io)
     if pisa_status.err:
@@ -1626,9 +1239,7 @@ def render_pdf_from_template(template_name, **context):
 def generate_paper():
     conn = get_db()
     cur = conn.cursor()
-    cur.execute("SELECT * FROM subjects ORDER BY code")
-    subjects_list = cur.fetchall()
-    conn.close()
+    subjects_list = _subjects_list()
 
     if request.method == "POST":
         subject_id = int(request.form["subject_id"])
@@ -1646,23 +1257,35 @@ def generate_paper():
             {"Easy": easy_q, "Medium": med_q, "Hard": hard_q},
         )
 
-        conn = get_db()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM subjects WHERE id=?", (subject_id,))
+        cur.execute(SQL_GET_SUBJECT, (subject_id,))
         subject = cur.fetchone()
-        conn.close()
 
-        pdf_io = render_pdf_from_template(
-            "paper_template.html",
-            subject=subject,
-            exam_type=exam_type,
-            questions=paper_questions,
-        )
+        # Same subject, exam type and question rows -> same PDF. The full rows
+        # are hashed (not just ids) so edited questions never hit a stale copy.
+        paper_hash = hashlib.blake2b(pickle.dumps((
+            tuple(subject),
+            exam_type,
+            sorted(tuple(q) for q in paper_questions),
+        ))).hexdigest()
+        cache_key = f"paper:{paper_hash}"
+
+        pdf_bytes = cache.get(cache_key)
+        if pdf_bytes is None:
+            pdf_io = render_pdf_from_template(
+                "paper_template.html",
+                subject=subject,
+                exam_type=exam_type,
+                questions=paper_questions,
+            )
+
+            if pdf_io is None:
+                return "Error generating PDF", 500
 
-        if pdf_io is None:
-            return "Error generating PDF", 500
+            pdf_bytes = pdf_io.getvalue()
+            cache.set(cache_key, pdf_bytes, timeout=PAPER_CACHE_TIMEOUT)
 
-        response = make_response(pdf_io.read())
+        response = make_response(pdf_bytes)
+        response.set_etag(paper_hash)
         response.headers["Content-Type"] = "application/pdf"
         response.headers[
             "Content-Disposition"
@@ -1679,16 +1302,12 @@ def generate_paper():
 def logs():
     conn = get_db()
     cur = conn.cursor()
-    cur.execute("""
-        SELECT l.action, l.timestamp, u.username
-        FROM logs l
-        JOIN users u ON l.user_id = u.id
-        ORDER BY l.id DESC
-    """)
+    # keyset pagination: newest first, ?after_id=<last id on previous page>
+    after_id = request.args.get("after_id", MAX_ROW_ID, type=int)
+    cur.execute(SQL_LIST_LOGS, (after_id, PAGE_SIZE + 1))
     data = cur.fetchall()
-    conn.close()
-    return render_template("logs.html", logs=data)
-
+    next_after_id = data[PAGE_SIZE - 1]["id"] if len(data) > PAGE_SIZE else None
+    return render_template("logs.html", logs=data[:PAGE_SIZE], next_after_id=next_after_id)
 
 
 if __name__ == "__main__":